@@ -1,17 +1,21 @@
 # src/chunking/document_chunking.py
 
+import csv
+import itertools
 import os
 import sys
+import time
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, Iterator, List
 
-import pandas as pd
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import semchunk
 from langchain_core.documents import Document
 
 from src.exception import CustomException
 from src.logger import logging
+from src.metrics import CHUNK_LATENCY
 
 # Project root: .../Banking-rag/
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -29,121 +33,168 @@ class DocumentChunkingConfig:
     # Chunking params
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    # Write buffer for the chunks CSV (1 MiB)
+    write_buffer_size: int = 1 << 20
+
+
+CHUNK_CSV_COLUMNS = ("text", "source", "doc_type")
+
+
+@lru_cache(maxsize=None)
+def _get_chunker(chunk_size: int):
+    """
+    Build the semchunk chunker once per chunk size and share it across
+    DocumentChunking instances (ingestion, flashcards, RAG all reuse it).
+    """
+    # Chunk sizes are measured in characters, so `len` is the token counter.
+    # It is O(1), so memoizing it would only pin every measured string in memory.
+    return semchunk.chunkerify(len, chunk_size=chunk_size, memoize=False)
 
 
 class DocumentChunking:
     def __init__(self):
         self.config = DocumentChunkingConfig()
+        self._chunker = _get_chunker(self.config.chunk_size)
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Lazily split each Document into chunks, carrying its metadata onto every chunk.
 
-    def create_chunks(self, documents: List[Document]) -> Tuple[str, List[Document]]:
+        Feed this to persist_chunks_csv to write chunks as they are produced,
+        holding only one document's chunks in memory at a time.
+        """
+        # Only the chunker calls are timed, so the metric covers splitting and
+        # not the (possibly lazy) loading of `documents` or the consumer's work.
+        # Recorded once per call, like the csv and PDF_LOAD samples.
+        split_seconds = 0.0
+        try:
+            for doc in documents:
+                start = time.perf_counter()
+                pieces = self._chunker(
+                    doc.page_content, overlap=self.config.chunk_overlap
+                )
+                split_seconds += time.perf_counter() - start
+                for piece in pieces:
+                    yield Document(page_content=piece, metadata=dict(doc.metadata))
+        finally:
+            CHUNK_LATENCY.labels("split").observe(split_seconds)
+
+    def chunk_documents(self, documents: Iterable[Document]) -> List[Document]:
         """
-        Split a list of LangChain Documents into smaller chunks and save them to CSV.
+        Split LangChain Documents into smaller chunks, with no I/O.
 
-        This is the original, RAG-oriented path:
-        - used when you want chunks persisted under artifacts/chunks/chunks.csv
-        - typically called during offline ingestion / indexing.
+        This is the path online code should use:
+        - ideal for per-request operations like "user uploads a PDF -> generate flashcards"
+        - same chunking config, but no artifacts/chunks/*.csv interaction.
 
         Args:
-            documents: List of LangChain Document objects (from fetch_documents)
+            documents: LangChain Document objects; may be a lazy iterator,
+                which is consumed once.
 
         Returns:
-            chunks_file_path (str): path to the saved chunks CSV.
             chunks (List[Document]): in-memory list of chunked Documents.
         """
-        logging.info("Entered DocumentChunking.create_chunks")
+        logging.info("Entered DocumentChunking.chunk_documents")
 
         try:
-            if not documents:
-                logging.warning("No documents provided to DocumentChunking.create_chunks")
-                # Ensure directory exists
-                os.makedirs(self.config.chunks_dir, exist_ok=True)
-                # Save an empty CSV with correct columns
-                empty_df = pd.DataFrame(columns=["text", "source", "doc_type"])
-                empty_df.to_csv(self.config.chunks_file, index=False)
-                return self.config.chunks_file, []
+            # Peek at the first document so lazy iterators aren't materialised
+            documents = iter(documents)
+            first = next(documents, None)
+            if first is None:
+                logging.warning("No documents provided to DocumentChunking.chunk_documents")
+                return []
 
             logging.info(
-                f"Splitting {len(documents)} documents into chunks "
+                "Splitting documents into chunks "
                 f"(size={self.config.chunk_size}, overlap={self.config.chunk_overlap})"
             )
 
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.config.chunk_size,
-                chunk_overlap=self.config.chunk_overlap,
-            )
-
-            chunks: List[Document] = splitter.split_documents(documents)
-            logging.info(f"Created {len(chunks)} chunks from {len(documents)} documents")
-
-            # Ensure directory exists
-            os.makedirs(self.config.chunks_dir, exist_ok=True)
-
-            # Convert chunks to a DataFrame
-            df = pd.DataFrame(
-                [
-                    {
-                        "text": chunk.page_content,
-                        "source": chunk.metadata.get("source", ""),
-                        "doc_type": chunk.metadata.get("doc_type", ""),
-                    }
-                    for chunk in chunks
-                ]
-            )
-
-            df.to_csv(self.config.chunks_file, index=False, header=True)
-            logging.info(
-                f"Saved {len(chunks)} chunks to {self.config.chunks_file}"
+            chunks: List[Document] = list(
+                self.iter_chunks(itertools.chain((first,), documents))
             )
+            logging.info(f"Created {len(chunks)} chunks")
 
-            return self.config.chunks_file, chunks
+            return chunks
 
         except Exception as e:
             logging.error(
-                "Error occurred in DocumentChunking.create_chunks", exc_info=True
+                "Error occurred in DocumentChunking.chunk_documents", exc_info=True
             )
             raise CustomException(e, sys)
 
-    def create_chunks_in_memory(self, documents: List[Document]) -> List[Document]:
+    def persist_chunks_csv(
+        self,
+        chunks: Iterable[Document],
+        path: str | None = None,
+    ) -> int:
         """
-        Split a list of LangChain Documents into smaller chunks without persisting to CSV.
+        Save chunks to CSV, one row per chunk, writing rows as they arrive.
 
-        This is the lighter-weight path:
-        - ideal for per-request operations like "user uploads a PDF -> generate flashcards"
-        - same chunking config, but no artifacts/chunks/*.csv interaction.
+        This is the offline, RAG-oriented path (artifacts/chunks/chunks.csv by
+        default). Passing a lazy iterator of chunks keeps memory bounded.
 
         Args:
-            documents: List of LangChain Document objects.
+            chunks: chunked Documents, e.g. from iter_chunks or chunk_documents.
+            path: CSV file to write; defaults to config.chunks_file.
 
         Returns:
-            chunks (List[Document]): in-memory list of chunked Documents.
-        """
-        logging.info("Entered DocumentChunking.create_chunks_in_memory")
-
-        try:
-            if not documents:
-                logging.warning("No documents provided to DocumentChunking.create_chunks_in_memory")
-                return []
-
-            logging.info(
-                f"[in-memory] Splitting {len(documents)} documents into chunks "
-                f"(size={self.config.chunk_size}, overlap={self.config.chunk_overlap})"
-            )
+            count (int): number of chunks written.
 
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.config.chunk_size,
-                chunk_overlap=self.config.chunk_overlap,
-            )
+        Raises:
+            ValueError: if there are no chunks to persist.
+        """
+        logging.info("Entered DocumentChunking.persist_chunks_csv")
 
-            chunks: List[Document] = splitter.split_documents(documents)
-            logging.info(
-                f"[in-memory] Created {len(chunks)} chunks from {len(documents)} documents"
-            )
+        path = path or self.config.chunks_file
+        no_chunks = False
 
-            return chunks
+        try:
+            # Peek inside the try: a lazy `chunks` may fail on its first item
+            chunks = iter(chunks)
+            first = next(chunks, None)
+            if first is None:
+                no_chunks = True
+                raise ValueError("No chunks provided to DocumentChunking.persist_chunks_csv")
+
+            # Ensure directory exists (a bare filename has none to create)
+            chunks_dir = os.path.dirname(path)
+            if chunks_dir:
+                os.makedirs(chunks_dir, exist_ok=True)
+
+            count = 0
+            # Only the writes are timed; `chunks` may be produced lazily upstream
+            write_seconds = 0.0
+            with open(
+                path,
+                "w",
+                newline="",
+                encoding="utf-8",
+                buffering=self.config.write_buffer_size,
+            ) as f:
+                writer = csv.writer(f)
+                writer.writerow(CHUNK_CSV_COLUMNS)
+                for chunk in itertools.chain((first,), chunks):
+                    start = time.perf_counter()
+                    writer.writerow(
+                        (
+                            chunk.page_content,
+                            chunk.metadata.get("source", ""),
+                            chunk.metadata.get("doc_type", ""),
+                        )
+                    )
+                    write_seconds += time.perf_counter() - start
+                    count += 1
+
+            CHUNK_LATENCY.labels("csv").observe(write_seconds)
+            logging.info(f"Saved {count} chunks to {path}")
+            return count
 
         except Exception as e:
+            if no_chunks:
+                # Caller error, surfaced as-is rather than wrapped
+                raise
             logging.error(
-                "Error occurred in DocumentChunking.create_chunks_in_memory", exc_info=True
+                "Error occurred in DocumentChunking.persist_chunks_csv", exc_info=True
             )
             raise CustomException(e, sys)
 
@@ -156,7 +207,8 @@ if __name__ == "__main__":
     docs = fetch_documents()  # uses your DATA_DIR and PDF loader
 
     chunker = DocumentChunking()
-    chunks_path, chunks = chunker.create_chunks(docs)
+    # Stream chunks straight to CSV rather than building the full list first
+    total = chunker.persist_chunks_csv(chunker.iter_chunks(docs))
 
-    print(f"Chunks saved to: {chunks_path}")
-    print(f"Total chunks: {len(chunks)}")
+    print(f"Chunks saved to: {chunker.config.chunks_file}")
+    print(f"Total chunks: {total}")
@@ -2,13 +2,136 @@
 
 from __future__ import annotations
 
-import json
-from typing import List, Dict
+import asyncio
+import hashlib
+import io
+import math
+import re
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Tuple
 
+import ijson
+import json_repair
+import orjson
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI  # adjust if you use a different LLM client
 
 from src.chunking.document_chunking import DocumentChunking
+from src.metrics import LLM_LATENCY
+
+# A single complete {"question": "...", "answer": "..."} object, used to salvage
+# cards from output that is not valid JSON even after repair
+_CARD_RE = re.compile(
+    r'\{\s*"question"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,'
+    r'\s*"answer"\s*:\s*"((?:[^"\\]|\\.)*)"\s*\}'
+)
+
+# Flashcard prompt, split around the document text. Only the card count varies.
+_PROMPT_PREFIX = """
+You are a helpful study assistant.
+
+Given the following document text, create at most {num_cards} high-quality flashcards.
+Each flashcard must contain:
+- a question (front of the card)
+- a short, precise answer (back of the card)
+
+Return ONLY valid JSON in exactly this format:
+
+{{
+  "cards": [
+    {{"question": "Question 1?", "answer": "Answer 1."}},
+    {{"question": "Question 2?", "answer": "Answer 2."}}
+  ]
+}}
+
+Do not include explanations, comments, or any extra keys.
+
+Document text:
+\"\"\""""
+_PROMPT_SUFFIX = '''"""
+'''
+
+# Changes whenever the prompt text does; used to key cached flashcards
+PROMPT_VERSION = hashlib.sha256(
+    (_PROMPT_PREFIX + _PROMPT_SUFFIX).encode("utf-8")
+).hexdigest()[:12]
+
+
+@lru_cache(maxsize=32)
+def _prompt_prefix(num_cards: int) -> str:
+    return _PROMPT_PREFIX.format(num_cards=num_cards)
+
+
+def _clean_cards(items) -> List[Dict[str, str]]:
+    """
+    Keep only cards with a non-empty string question and answer, stripped.
+    """
+    cards: List[Dict[str, str]] = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        q = item.get("question")
+        a = item.get("answer")
+        if not isinstance(q, str) or not isinstance(a, str):
+            continue
+        q, a = q.strip(), a.strip()
+        if q and a:
+            cards.append({"question": q, "answer": a})
+
+    return cards
+
+
+def _is_json_object(raw: str) -> bool:
+    """
+    Whether the span between the first '{' and last '}' is valid JSON.
+    """
+    start = raw.find("{")
+    end = raw.rfind("}")
+    if start == -1 or end < start:
+        return False
+    try:
+        orjson.loads(raw[start : end + 1])
+    except orjson.JSONDecodeError:
+        return False
+    return True
+
+
+class _CardStreamParser:
+    """
+    Incrementally pull complete cards out of a streamed `{"cards": [...]}` response.
+
+    Text before the first '{' (e.g. a ```json fence) is skipped. Parsing stops at
+    the first syntax error (`failed` is then set); callers should salvage the
+    rest of the response from its full text with `_parse_flashcards`.
+    """
+
+    def __init__(self) -> None:
+        self._items = ijson.sendable_list()
+        self._coro = ijson.items_coro(self._items, "cards.item")
+        self._started = False
+        self.failed = False
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        if self.failed:
+            return []
+
+        if not self._started:
+            start = text.find("{")
+            if start == -1:
+                return []
+            text = text[start:]
+            self._started = True
+
+        try:
+            self._coro.send(text.encode("utf-8"))
+        except ijson.JSONError:
+            # Malformed card or trailing commentary; keep what was parsed so far
+            self.failed = True
+
+        items = list(self._items)
+        del self._items[:]
+        return _clean_cards(items)
 
 
 class FlashcardPipeline:
@@ -18,104 +141,306 @@ class FlashcardPipeline:
     Flow:
     - Take LangChain Documents (e.g. from an uploaded PDF)
     - Chunk them using the existing DocumentChunking logic
-    - Concatenate chunk text into a single context
-    - Ask the LLM to produce flashcards as JSON
+    - Group chunk text into contexts that fit a per-call character budget,
+      with no more groups than requested cards
+    - Ask the LLM to produce flashcards as JSON for each group
+    - Merge the cards, dropping duplicate questions
     """
 
     def __init__(
         self,
         model_name: str = "gpt-4.1-mini",
         max_cards: int = 20,
+        max_chars_per_call: int = 8000,
+        max_concurrency: int = 8,
     ) -> None:
-        self.llm = ChatOpenAI(model=model_name)  # you can change this model name
+        # Deferred so importing this module doesn't pull in the OpenAI client stack
+        from langchain_openai import ChatOpenAI  # adjust if you use a different LLM client
+
+        # you can change this model name
+        self.llm = ChatOpenAI(model=model_name, max_retries=2)
         self.chunker = DocumentChunking()
         self.max_cards = max_cards
+        self.max_chars_per_call = max_chars_per_call
+        # Upper bound on simultaneous LLM calls for a single request
+        self.max_concurrency = max_concurrency
 
-    def _build_prompt(self, text: str, num_cards: int) -> str:
+    def _build_prompt(self, num_cards: int) -> Tuple[str, str]:
         """
         Prompt the LLM to produce flashcards in a structured JSON format.
+
+        Returns the (prefix, suffix) that wrap the document text, so callers can
+        stream chunk text between them without building an intermediate string.
         """
-        return f"""
-You are a helpful study assistant.
+        return _prompt_prefix(num_cards), _PROMPT_SUFFIX
 
-Given the following document text, create at most {num_cards} high-quality flashcards.
-Each flashcard must contain:
-- a question (front of the card)
-- a short, precise answer (back of the card)
+    def _parse_flashcards(self, raw: str) -> List[Dict[str, str]]:
+        """
+        Parse the JSON returned by the LLM into a list of {question, answer} dicts.
 
-Return ONLY valid JSON in exactly this format:
+        Malformed output (trailing commentary, truncation mid-array) is repaired
+        rather than rejected, so any complete cards are kept instead of failing
+        the whole response.
+        """
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Repair the JSON starting at the first '{', e.g. close a truncated array
+            start = raw.find("{")
+            data = json_repair.loads(raw[start:] if start != -1 else raw)
 
-{{
-  "cards": [
-    {{"question": "Question 1?", "answer": "Answer 1."}},
-    {{"question": "Question 2?", "answer": "Answer 2."}}
-  ]
-}}
+        if isinstance(data, dict) and isinstance(data.get("cards"), list):
+            cards = _clean_cards(data["cards"])
+            if cards:
+                return cards
 
-Do not include explanations, comments, or any extra keys.
+        # Last resort: treat the output as a stream of individual card objects
+        salvaged: List[Dict[str, str]] = []
+        for q, a in _CARD_RE.findall(raw):
+            try:
+                salvaged.append(
+                    {"question": orjson.loads(f'"{q}"'), "answer": orjson.loads(f'"{a}"')}
+                )
+            except orjson.JSONDecodeError:
+                continue
 
-Document text:
-\"\"\"{text}\"\"\"
-"""
+        return _clean_cards(salvaged)
 
-    def _parse_flashcards(self, raw: str) -> List[Dict[str, str]]:
+    def _group_chunks(
+        self, chunks: List[Document], max_groups: int
+    ) -> List[List[Document]]:
         """
-        Parse the JSON returned by the LLM into a list of {question, answer} dicts.
+        Pack consecutive chunks into at most `max_groups` groups.
+
+        Groups aim to stay within `max_chars_per_call`; when that would need more
+        than `max_groups` groups, the per-group budget grows instead, so long
+        documents never fan out into more calls than there are cards to ask for.
+        A single oversized chunk gets a group of its own.
         """
-        # Try to extract JSON between first '{' and last '}'
-        start = raw.find("{")
-        end = raw.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            json_str = raw[start : end + 1]
-        else:
-            json_str = raw
+        total_len = sum(len(c.page_content) for c in chunks)
+        budget = max(self.max_chars_per_call, math.ceil(total_len / max_groups))
+
+        groups: List[List[Document]] = []
+        current: List[Document] = []
+        current_len = 0
+
+        for chunk in chunks:
+            chunk_len = len(chunk.page_content)
+            if current and current_len + chunk_len > budget:
+                groups.append(current)
+                current, current_len = [], 0
+            current.append(chunk)
+            current_len += chunk_len
+
+        if current:
+            groups.append(current)
+
+        if len(groups) <= max_groups:
+            return groups
+
+        # Greedy packing overshot; split by character offset into max_groups runs
+        groups = [[] for _ in range(max_groups)]
+        offset = 0
+        for chunk in chunks:
+            index = min(max_groups - 1, offset * max_groups // max(total_len, 1))
+            groups[index].append(chunk)
+            offset += len(chunk.page_content)
+
+        return [group for group in groups if group]
 
-        data = json.loads(json_str)
-        cards_raw = data.get("cards", [])
+    def _build_prompts(self, chunks: List[Document], num_cards: int) -> List[str]:
+        """
+        Build one prompt per chunk group, splitting the card budget across groups.
+        """
+        groups = self._group_chunks(chunks, max_groups=max(1, num_cards))
+        cards_per_group = max(1, math.ceil(num_cards / len(groups)))
+        prefix, suffix = self._build_prompt(cards_per_group)
+
+        prompts: List[str] = []
+        for group in groups:
+            buf = io.StringIO()
+            buf.write(prefix)
+            for i, chunk in enumerate(group):
+                if i:
+                    buf.write("\n\n")
+                buf.write(chunk.page_content)
+            buf.write(suffix)
+            prompts.append(buf.getvalue())
+
+        return prompts
+
+    @staticmethod
+    def _response_text(response) -> str:
+        # For ChatOpenAI, response is usually an object with `.content`
+        if hasattr(response, "content"):
+            return response.content
+        return str(response)
+
+    def _merge_flashcards(self, responses, num_cards: int) -> List[Dict[str, str]]:
+        """
+        Parse every LLM response and merge the cards, deduplicating on the question.
+        """
         cards: List[Dict[str, str]] = []
+        seen = set()
 
-        for item in cards_raw:
-            q = item.get("question", "").strip()
-            a = item.get("answer", "").strip()
-            if q and a:
-                cards.append({"question": q, "answer": a})
+        for response in responses:
+            for card in self._parse_flashcards(self._response_text(response)):
+                if card["question"] in seen:
+                    continue
+                seen.add(card["question"])
+                cards.append(card)
 
-        return cards
+        return cards[:num_cards]
 
     def generate_from_docs(
         self,
-        documents: List[Document],
+        documents: Iterable[Document],
         max_cards: int | None = None,
     ) -> List[Dict[str, str]]:
         """
         High-level entry point:
-        - chunk docs in-memory
-        - merge chunk content
-        - call LLM
-        - parse flashcards
+        - chunk docs in-memory (documents may be a lazy iterator)
+        - group chunk content into per-call contexts
+        - call the LLM once per group (batched)
+        - parse and merge flashcards
 
         Returns:
             List of dicts: [{"question": "...", "answer": "..."}, ...]
         """
-        if not documents:
+        # Use the in-memory chunking path so we don't write CSVs for each request
+        chunks = self.chunker.chunk_documents(documents)
+        if not chunks:
             return []
 
-        # Use the in-memory chunking path so we don't write CSVs for each request
-        chunks = self.chunker.create_chunks_in_memory(documents)
+        num_cards = max_cards or self.max_cards
+        prompts = self._build_prompts(chunks, num_cards)
+        with LLM_LATENCY.labels("batch").time():
+            responses = self.llm.batch(
+                prompts, config={"max_concurrency": self.max_concurrency}
+            )
+
+        return self._merge_flashcards(responses, num_cards)
+
+    async def agenerate_from_docs(
+        self,
+        documents: Iterable[Document],
+        max_cards: int | None = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Async variant of `generate_from_docs` for use inside the event loop.
+
+        The per-group LLM calls are fanned out with `asyncio.gather`, so network
+        round trips overlap instead of running one after another (at most
+        `max_concurrency` at a time).
+
+        Returns:
+            List of dicts: [{"question": "...", "answer": "..."}, ...]
+        """
+        # Chunking is CPU-bound; keep it off the event loop
+        chunks = await asyncio.to_thread(self.chunker.chunk_documents, documents)
         if not chunks:
             return []
 
-        combined_text = "\n\n".join(c.page_content for c in chunks)
         num_cards = max_cards or self.max_cards
+        prompts = self._build_prompts(chunks, num_cards)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        prompt = self._build_prompt(combined_text, num_cards)
-        response = self.llm.invoke(prompt)
+        async def _invoke(prompt: str):
+            async with semaphore:
+                return await self.llm.ainvoke(prompt)
 
-        # For ChatOpenAI, response is usually an object with `.content`
-        if hasattr(response, "content"):
-            raw_output = response.content
-        else:
-            raw_output = str(response)
+        with LLM_LATENCY.labels("async").time():
+            responses = await asyncio.gather(*(_invoke(p) for p in prompts))
+
+        return self._merge_flashcards(responses, num_cards)
+
+    async def astream_from_docs(
+        self,
+        documents: Iterable[Document],
+        max_cards: int | None = None,
+        on_parse_failure: Callable[[], None] | None = None,
+    ) -> AsyncIterator[Dict[str, str]]:
+        """
+        Streaming variant of `agenerate_from_docs`.
+
+        Every chunk group is streamed from the LLM concurrently, and each card is
+        yielded as soon as its JSON object is complete, so clients can render
+        cards while the rest are still being decoded. Duplicate questions are
+        dropped and generation stops once `max_cards` cards have been yielded.
+
+        When a group's stream ends, its full text is also run through
+        `_parse_flashcards`, so cards the incremental parser missed (malformed
+        JSON, truncation) are still yielded. `on_parse_failure` is called when
+        a group's output was not a complete JSON object, e.g. so callers can
+        avoid caching a result that may be partial.
+
+        Yields:
+            dicts: {"question": "...", "answer": "..."}
+        """
+        # Chunking is CPU-bound; keep it off the event loop
+        chunks = await asyncio.to_thread(self.chunker.chunk_documents, documents)
+        if not chunks:
+            return
+
+        num_cards = max_cards or self.max_cards
+        prompts = self._build_prompts(chunks, num_cards)
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _produce(prompt: str) -> None:
+            parser = _CardStreamParser()
+            raw: List[str] = []
+            streamed = set()
+            try:
+                async with semaphore:
+                    async for message in self.llm.astream(prompt):
+                        text = self._response_text(message)
+                        raw.append(text)
+                        for card in parser.feed(text):
+                            streamed.add(card["question"])
+                            queue.put_nowait(card)
+
+                # Salvage anything the incremental parser could not get to
+                full = "".join(raw)
+                salvaged = [
+                    card
+                    for card in self._parse_flashcards(full)
+                    if card["question"] not in streamed
+                ]
+                # Malformed or truncated output; text around a complete object
+                # (e.g. ``` fences) is harmless
+                broken = not _is_json_object(full)
+                if (broken or salvaged) and on_parse_failure is not None:
+                    on_parse_failure()
+                for card in salvaged:
+                    queue.put_nowait(card)
+            except Exception as exc:
+                queue.put_nowait(exc)
+            finally:
+                # Sentinel: this group's stream is finished
+                queue.put_nowait(None)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(_produce(p)) for p in prompts]
+        pending = len(tasks)
+        seen = set()
+
+        try:
+            while pending:
+                item = await queue.get()
+                if item is None:
+                    pending -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                if item["question"] in seen:
+                    continue
 
-        cards = self._parse_flashcards(raw_output)
-        return cards
+                seen.add(item["question"])
+                yield item
+                if len(seen) >= num_cards:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            LLM_LATENCY.labels("stream").observe(time.perf_counter() - started)
@@ -0,0 +1,30 @@
+"""
+Prometheus metrics for the ingestion, chunking and flashcard stages.
+
+Exposed by the FastAPI server at GET /metrics.
+"""
+
+from prometheus_client import Histogram
+
+# Document chunking, one sample per call, by path: "split" (total splitting time
+# in iter_chunks/chunk_documents) or "csv" (writing rows in persist_chunks_csv).
+# Neither includes PDF parsing; see PDF_LOAD.
+CHUNK_LATENCY = Histogram(
+    "chunk_seconds",
+    "Time spent splitting documents into chunks or writing chunks to CSV",
+    ["path"],
+)
+
+# Flashcard LLM calls, by mode: "batch", "async" or "stream"
+LLM_LATENCY = Histogram(
+    "llm_seconds",
+    "Wall-clock time of the flashcard LLM calls for one request",
+    ["mode"],
+)
+
+# PDF text extraction, by path: "bulk" (fetch_documents) or "upload" (load_uploaded_pdf)
+PDF_LOAD = Histogram(
+    "pdf_load_seconds",
+    "Time spent extracting text from PDFs",
+    ["path"],
+)
@@ -1,20 +1,35 @@
 """
-FastAPI application exposing the Banking RAG pipeline via /ask
-and a flashcard generator via /flashcards.
+FastAPI application exposing the Banking RAG pipeline via /ask,
+a flashcard generator via /flashcards (and /flashcards/stream),
+and Prometheus metrics via /metrics.
 """
 
-from typing import List
+from typing import AsyncIterator, List, Tuple
 
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from prometheus_fastapi_instrumentator import Instrumentator
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from src.server.dependencies import get_pipeline, get_flashcard_pipeline
+from src.server.dependencies import (
+    get_flashcard_cache,
+    get_flashcard_pipeline,
+    get_pipeline,
+)
 from src.server.schemas import AskRequest, AskResponse, SourceDocument, FlashcardResponse, Flashcard
+from src.flashcards.flashcard_pipeline import PROMPT_VERSION, FlashcardPipeline
 from src.ingestion.fetch_documents import load_uploaded_pdf
 
+import hashlib
+import json
 import os
 import tempfile
 
+# Block size used when streaming uploads to disk
+UPLOAD_COPY_BUFSIZE = 1024 * 1024
+
 app = FastAPI(
     title="Banking RAG API",
     version="0.1.0",
@@ -30,6 +45,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request metrics plus the stage histograms in src.metrics, at GET /metrics
+Instrumentator().instrument(app).expose(app)
+
 
 @app.on_event("startup")
 def warm_pipeline() -> None:
@@ -62,6 +80,53 @@ def _build_sources(docs, max_items: int = 3) -> List[SourceDocument]:
     return sources
 
 
+def _copy_and_hash(src, dst, bufsize: int) -> str:
+    """
+    Copy `src` to `dst` in blocks, returning the SHA-256 hex digest of the bytes.
+    """
+    digest = hashlib.sha256()
+    while True:
+        block = src.read(bufsize)
+        if not block:
+            break
+        digest.update(block)
+        dst.write(block)
+    return digest.hexdigest()
+
+
+async def _save_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream the upload to a temp file so the PDF loader can read it, without
+    buffering the whole PDF in memory or blocking the event loop.
+
+    Returns:
+        (tmp_path, sha256 hex digest of the uploaded bytes)
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        digest = await run_in_threadpool(
+            _copy_and_hash, file.file, tmp, UPLOAD_COPY_BUFSIZE
+        )
+    return tmp.name, digest
+
+
+def _flashcard_cache_key(
+    flashcard_pipeline: FlashcardPipeline, digest: str, max_cards: int
+) -> Tuple[str, int, str, str]:
+    """
+    Cache key for generated flashcards: the upload plus everything that shapes
+    the LLM output, so a model or prompt change doesn't serve stale cards.
+    """
+    return (digest, max_cards, flashcard_pipeline.llm.model_name, PROMPT_VERSION)
+
+
+def _sse_event(data: str, event: str | None = None) -> str:
+    """
+    Format a single server-sent event.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {data}\n\n"
+
+
 @app.post("/ask", response_model=AskResponse)
 def ask_question(payload: AskRequest) -> AskResponse:
     """
@@ -91,23 +156,33 @@ async def generate_flashcards(
     Generate flashcards from an uploaded PDF.
 
     Flow:
-    - Save the uploaded file to a temporary location
-    - Load it as LangChain Documents
+    - Save the uploaded file to a temporary location, hashing it on the way
+    - Return cached flashcards if this PDF was seen before with the same
+      max_cards, model and prompt
+    - Otherwise load it as LangChain Documents
     - Run the FlashcardPipeline to get question/answer pairs
     """
     flashcard_pipeline = get_flashcard_pipeline()
+    cache = get_flashcard_cache()
 
-    # Save uploaded bytes to a temp file so PyPDFLoader can read it
     try:
-        contents = await file.read()
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(contents)
-            tmp_path = tmp.name
+        tmp_path, digest = await _save_upload(file)
 
         try:
-            docs = load_uploaded_pdf(tmp_path, doc_type="flashcard_upload")
-            cards = flashcard_pipeline.generate_from_docs(docs, max_cards=max_cards)
+            cache_key = _flashcard_cache_key(flashcard_pipeline, digest, max_cards)
+            # diskcache is blocking SQLite/file I/O; keep it off the event loop
+            cards = await run_in_threadpool(cache.get, cache_key)
+
+            if cards is None:
+                docs = await run_in_threadpool(
+                    load_uploaded_pdf, tmp_path, doc_type="flashcard_upload"
+                )
+                cards = await flashcard_pipeline.agenerate_from_docs(
+                    docs, max_cards=max_cards
+                )
+                # Don't pin a failed generation to this PDF
+                if cards:
+                    await run_in_threadpool(cache.set, cache_key, cards)
 
             flashcards = [Flashcard(**card) for card in cards]
             return FlashcardResponse(flashcards=flashcards)
@@ -117,6 +192,71 @@ async def generate_flashcards(
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@app.post("/flashcards/stream")
+async def stream_flashcards(
+    file: UploadFile = File(...),
+    max_cards: int = 20,
+) -> StreamingResponse:
+    """
+    Generate flashcards from an uploaded PDF as a server-sent event stream.
+
+    Each card is sent as a `data: {"question": ..., "answer": ...}` event as
+    soon as the LLM has finished writing it, followed by a final `end` event
+    (or an `error` event carrying `{"detail": ...}`). Shares the /flashcards cache.
+    """
+    flashcard_pipeline = get_flashcard_pipeline()
+    cache = get_flashcard_cache()
+
+    # Save the upload before returning: the request body is gone once streaming starts
+    try:
+        tmp_path, digest = await _save_upload(file)
+    except Exception as exc:  # pragma: no cover
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+    cache_key = _flashcard_cache_key(flashcard_pipeline, digest, max_cards)
+
+    async def _events() -> AsyncIterator[str]:
+        try:
+            cards = await run_in_threadpool(cache.get, cache_key)
+
+            if cards is not None:
+                for card in cards:
+                    yield _sse_event(Flashcard(**card).model_dump_json())
+            else:
+                cards = []
+                parse_failed = False
+
+                def _mark_parse_failed() -> None:
+                    nonlocal parse_failed
+                    parse_failed = True
+
+                docs = await run_in_threadpool(
+                    load_uploaded_pdf, tmp_path, doc_type="flashcard_upload"
+                )
+                async for card in flashcard_pipeline.astream_from_docs(
+                    docs,
+                    max_cards=max_cards,
+                    on_parse_failure=_mark_parse_failed,
+                ):
+                    cards.append(card)
+                    yield _sse_event(Flashcard(**card).model_dump_json())
+                # Only cache clean results; a salvaged stream may be incomplete
+                if cards and not parse_failed:
+                    await run_in_threadpool(cache.set, cache_key, cards)
+
+            yield _sse_event("{}", event="end")
+        except Exception as exc:  # pragma: no cover - reported to the client
+            yield _sse_event(json.dumps({"detail": str(exc)}), event="error")
+
+    # Runs once the response finishes, even if the client disconnects before
+    # the generator is first iterated
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        background=BackgroundTask(os.remove, tmp_path),
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -2,8 +2,12 @@
 Shared dependency helpers for server-facing modules.
 """
 
+import os
+import tempfile
 from functools import lru_cache
 
+from diskcache import Cache
+
 from src.pipeline.rag_pipeline import RAGPipeline
 from src.flashcards.flashcard_pipeline import FlashcardPipeline
 
@@ -24,3 +28,18 @@ def get_flashcard_pipeline() -> FlashcardPipeline:
     FastAPI routes that generate flashcards from uploaded PDFs.
     """
     return FlashcardPipeline()
+
+
+# Flashcard results cache: <tmp>/flashcard_cache, capped at 256 MiB
+FLASHCARD_CACHE_DIR = os.path.join(tempfile.gettempdir(), "flashcard_cache")
+FLASHCARD_CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+
+
+@lru_cache(maxsize=1)
+def get_flashcard_cache() -> Cache:
+    """
+    Lazily open the on-disk cache of generated flashcards, keyed by
+    (sha256 of the uploaded PDF, max_cards, model name, prompt version),
+    so re-uploads skip the LLM.
+    """
+    return Cache(FLASHCARD_CACHE_DIR, size_limit=FLASHCARD_CACHE_SIZE_LIMIT)
@@ -4,15 +4,26 @@ Gradio chat interface connected to the FastAPI /ask endpoint.
 
 from __future__ import annotations
 
-from typing import List, Sequence, Tuple, Union
+import asyncio
+import atexit
+from typing import TYPE_CHECKING, List, Sequence, Tuple, Union
 
-import gradio as gr
 import httpx
 
 from src.server.schemas import AskResponse, AskRequest
 
+if TYPE_CHECKING:
+    import gradio as gr
+
 DEFAULT_API_URL = "http://localhost:8000"
 
+# Shared client so chat turns reuse pooled connections instead of
+# reconnecting to the API on every message.
+_HTTP = httpx.AsyncClient(
+    timeout=60,
+    limits=httpx.Limits(max_connections=32),
+)
+
 
 ChatHistory = Sequence[Union[dict, Tuple[str, str]]]
 
@@ -55,7 +66,7 @@ def _format_answer(response: AskResponse) -> str:
     return "\n".join(answer_lines)
 
 
-def _chat_response(
+async def _chat_response(
     message: str,
     history: ChatHistory | None,
     doc_type: str,
@@ -71,11 +82,10 @@ def _chat_response(
     ).model_dump()
 
     try:
-        with httpx.Client(timeout=60) as client:
-            resp = client.post(f"{api_url.rstrip('/')}/ask", json=payload)
-            resp.raise_for_status()
-            ask_response = AskResponse(**resp.json())
-            answer = _format_answer(ask_response)
+        resp = await _HTTP.post(f"{api_url.rstrip('/')}/ask", json=payload)
+        resp.raise_for_status()
+        ask_response = AskResponse(**resp.json())
+        answer = _format_answer(ask_response)
     except Exception as exc:  # pragma: no cover - UI feedback only
         answer = f"Error talking to API: {exc}"
 
@@ -89,6 +99,9 @@ def build_interface(default_api_url: str = DEFAULT_API_URL) -> gr.Blocks:
     """
     Construct the Gradio Blocks app connected to the FastAPI backend.
     """
+    # Gradio is heavy to import and only needed once the UI is actually built
+    import gradio as gr
+
     with gr.Blocks(title="Banking RAG Chat") as demo:
         gr.Markdown(
             """
@@ -120,8 +133,8 @@ def build_interface(default_api_url: str = DEFAULT_API_URL) -> gr.Blocks:
         )
         clear_btn = gr.Button("Clear conversation")
 
-        def _respond(user_message, chat_history, doc_type_value, api_url_value):
-            return _chat_response(
+        async def _respond(user_message, chat_history, doc_type_value, api_url_value):
+            return await _chat_response(
                 user_message,
                 chat_history or [],
                 doc_type_value,
@@ -139,6 +152,16 @@ def build_interface(default_api_url: str = DEFAULT_API_URL) -> gr.Blocks:
     return demo
 
 
+def _close_http_client() -> None:
+    """
+    Close the shared HTTP client's pooled connections on interpreter exit.
+    """
+    try:
+        asyncio.run(_HTTP.aclose())
+    except Exception:  # pragma: no cover - best-effort cleanup
+        pass
+
+
 def launch(
     api_url: str = DEFAULT_API_URL,
     host: str = "0.0.0.0",
@@ -148,6 +171,7 @@ def launch(
     """
     Convenience launcher for local testing.
     """
+    atexit.register(_close_http_client)
     interface = build_interface(api_url)
     interface.launch(server_name=host, server_port=port, share=share)
 